@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
+import functools
+import sys
 import pyvisa
 import numpy as np
+from dataclasses import dataclass
+from types import MappingProxyType
+from pyvisa import constants
 
 '''
 Instrument Driver for:  Agilent / Keysight
@@ -62,12 +68,15 @@ Channel:
     Most functions provide 'get' with no params, and 'set' with the passed value
     Provides access to Measure class
 Measure:
-    All methods are of type 'get'
+    All methods are of type 'get', values are returned as numpy.float32
     Provides all available 'single' measurement values: voltage, current, power(calculated)
     Provides all statistical: min, max, avg, high, low, rms values
 Log:
     Sets and returns values related to integration time, sample points, etc
     Provides function: start_measure_sample to initiate a high speed data acquisition
+    Provides functions: arm_meas_sample / await_meas_sample to start an acquisition
+                        and collect it later, acquire() to await it from asyncio
+    Provides function: restore_registers to restore the status registers after sampling
     Provides the data storage for high speed data acquisition
     Provides access to the Trigger class
 Trigger:
@@ -83,7 +92,137 @@ DigitalIO
 '''
 
 
-global_input_values = {}
+# SCPI (query, write) command pairs for Command.read_write
+# Common
+_ESE = ('*ESE?', '*ESE')
+_OPC = ('*OPC?', '*OPC')
+_RCL = ('*RCL?', '*RCL')
+_SAV = ('*SAV?', '*SAV')
+_SRE = ('*SRE?', '*SRE')
+
+# Channel
+_CURR_RANG = ('SENS:CURR:RANG?', 'SENS:CURR:RANG')
+_COMP_MODE = ('OUTP:COMP:MODE?', 'OUTP:COMP:MODE')
+_RES = ('RES?', 'RES')
+
+# Format
+_FORM_DATA = (':FORM:DATA?', ':FORM:DATA')
+_FORM_BORD = (':FORM:BORD?', ':FORM:BORD')
+
+# Log
+_SWE_POIN = ('SENS:SWE:POIN?', 'SENS:SWE:POIN')
+_SWE_TINT = ('SENS:SWE:TINT?', 'SENS:SWE:TINT')
+_SWE_OFFS_POIN = ('SENS:SWE:OFFS:POIN?', 'SENS:SWE:OFFS:POIN')
+
+# Trigger
+_TRIG_SOUR = ('TRIG:ACQ:SOUR?', 'TRIG:ACQ:SOUR')
+_TRIG_COUN_CURR = ('TRIG:ACQ:COUN:CURR?', 'TRIG:ACQ:COUN:CURR')
+_TRIG_COUN_VOLT = ('TRIG:ACQ:COUN:VOLT?', 'TRIG:ACQ:COUN:VOLT')
+_TRIG_HYST_CURR = ('TRIG:ACQ:HYST:CURR?', 'TRIG:ACQ:HYST:CURR')
+_TRIG_HYST_VOLT = ('TRIG:ACQ:HYST:VOLT?', 'TRIG:ACQ:HYST:VOLT')
+_TRIG_HYST_DVM = ('TRIG:ACQ:HYST:DVM?', 'TRIG:ACQ:HYST:DVM')
+_TRIG_LEV_CURR = ('TRIG:ACQ:LEV:CURR?', 'TRIG:ACQ:LEV:CURR')
+_TRIG_LEV_VOLT = ('TRIG:ACQ:LEV:VOLT?', 'TRIG:ACQ:LEV:VOLT')
+_TRIG_LEV_DVM = ('TRIG:ACQ:LEV:DVM?', 'TRIG:ACQ:LEV:DVM')
+_TRIG_SLOP_CURR = ('TRIG:ACQ:SLOP:CURR?', 'TRIG:ACQ:SLOP:CURR')
+_TRIG_SLOP_VOLT = ('TRIG:ACQ:SLOP:VOLT?', 'TRIG:ACQ:SLOP:VOLT')
+_TRIG_SLOP_DVM = ('TRIG:ACQ:SLOP:DVM?', 'TRIG:ACQ:SLOP:DVM')
+
+# Status
+_OPER_ENAB = (':STAT:OPER:ENAB?', ':STAT:OPER:ENAB')
+_OPER_PTR = (':STAT:OPER:PTR?', ':STAT:OPER:PTR')
+_OPER_NTR = (':STAT:OPER:NTR?', ':STAT:OPER:NTR')
+_QUES_ENAB = (':STAT:QUES:ENAB?', ':STAT:QUES:ENAB')
+_QUES_PTR = (':STAT:QUES:PTR?', ':STAT:QUES:PTR')
+_QUES_NTR = (':STAT:QUES:NTR?', ':STAT:QUES:NTR')
+
+# Valid (str) inputs for the validators, lower case
+_MIN_MAX = frozenset(('min', 'max'))
+_COMP_MODES = frozenset(('low', 'high'))
+_COMP_MODES_EXPANDED = frozenset((
+    'llocal', 'lloc', 'hlocal', 'hloc',
+    'lremote', 'lrem', 'hremote', 'hrem'))
+_CHANNELS = frozenset(('1', '2'))
+_DATA_FORMATS = frozenset(('ascii', 'asc', 'real'))
+_BYTE_ORDERS = frozenset(('normal', 'norm', 'swapped', 'swap'))
+_TRIG_SOURCES = frozenset(('int', 'ext', 'bus'))
+_SENSE_FUNCS = frozenset(('volt', 'curr'))
+_SENSE_FUNCS_DVM = frozenset(('volt', 'curr', 'dvm'))
+_SLOPES = frozenset(('pos', 'neg', 'eith'))
+_TIMEOUT_KEYWORDS = frozenset(('inf', 'min', 'max', 'def', 'default'))
+
+# Upper case (SCPI) form of every keyword above, returned by the validators
+_KEYWORD_UPPER = MappingProxyType({
+    keyword: keyword.upper() for keyword in frozenset().union(
+        _MIN_MAX, _COMP_MODES, _COMP_MODES_EXPANDED, _CHANNELS,
+        _DATA_FORMATS, _BYTE_ORDERS, _TRIG_SOURCES, _SENSE_FUNCS_DVM,
+        _SLOPES, _TIMEOUT_KEYWORDS)})
+# and the reverse, so input already in SCPI form needs no .lower()
+_KEYWORD_LOWER = MappingProxyType({
+    upper: keyword for keyword, upper in _KEYWORD_UPPER.items()})
+
+# ANSI escape sequences for terminal messages
+_ANSI = MappingProxyType({
+    'HEADER': '\033[95m',
+    'OKBLUE': '\033[94m',
+    'OKGREEN': '\033[92m',
+    'WARNING': '\033[93m',
+    'FAIL': '\033[91m',
+    'ENDC': '\033[0m',
+    'BOLD': '\033[1m',
+    'UNDERLINE': '\033[4m'})
+_ANSI_WARNING = _ANSI['WARNING']
+_ANSI_ENDC = _ANSI['ENDC']
+
+
+# Write a warning (invalid input) message to stderr, in one write call
+# sys.stderr is looked up each time so a redirected stream is honoured
+def _warn(msg):
+    sys.stderr.write(f'{_ANSI_WARNING}{msg}{_ANSI_ENDC}\n')
+
+
+@functools.lru_cache(maxsize=256, typed=True)
+def _cached_str(value):
+    return str(value)
+
+
+# String form of a value written to the instrument; setpoints repeat, so
+# str/int/float conversions are cached (typed keeps 1 and 1.0 apart).
+# Anything else, including unhashable values, is converted directly, as
+# are zeros: 0.0 and -0.0 are one cache key but format differently
+def _fmt(value):
+    if type(value) in (str, int, float) and value:
+        return _cached_str(value)
+    return str(value)
+
+
+# Validator errors keep the message template and its arguments; the text
+# is only formatted when the error is shown. Keyword sets print sorted
+class _LazyMessage:
+    def __str__(self):
+        template, *args = self.args
+        return template.format(*(
+            sorted(arg) if isinstance(arg, frozenset) else arg
+            for arg in args))
+
+
+class _LazyValueError(_LazyMessage, ValueError):
+    pass
+
+
+class _LazyTypeError(_LazyMessage, TypeError):
+    pass
+
+
+# Model capabilities, identified when the Device connects
+@dataclass(frozen=True, slots=True)
+class DeviceCaps:
+    model: str
+    has_ch2: bool
+    has_dvm: bool
+    has_expanded: bool
+
+
 class Device:
     def __init__(self, visa_addr='GPIB0::2::INSTR'):
         self._address = str(visa_addr)
@@ -98,22 +237,25 @@ class Device:
 
         # Validate device model
         model = str(self._bus.query('*IDN?')).split(',')[1]
-        global_input_values['model'] = model
-        global_input_values['ch2'] = model in ('66319B', '66319D')
-        global_input_values['dvm'] = model in \
-            ('66321D', '66319D', '66309D')
-        global_input_values['expanded_features'] = model in \
-            ('66321B', '66321D', '66319B', '66319D')
+        self._caps = DeviceCaps(
+            model=model,
+            has_ch2=model in ('66319B', '66319D'),
+            has_dvm=model in ('66321D', '66319D', '66309D'),
+            has_expanded=model in ('66321B', '66321D', '66319B', '66319D'))
+
+        # Settings cache readers of this device, re-run after *RST/*RCL
+        self._settings_readers = []
+        readers = self._settings_readers
 
         # Device class shortcuts
-        self.com = Common(self._bus)
-        self.display = Display(self._bus)
-        self.format = Format(self._bus, 'ASC')
-        self.ch1 = Channel(self._bus, '1')
-        self.log = Log(self._bus)
-        self.status = Status(self._bus)
-        if global_input_values['ch2']:
-            self.ch2 = Channel(self._bus, '2')
+        self.com = Common(self._bus, readers)
+        self.display = Display(self._bus, self._caps)
+        self.format = Format(self._bus, self._caps, readers, 'ASC')
+        self.ch1 = Channel(self._bus, self._caps, readers, '1')
+        self.log = Log(self._bus, self._caps, readers, self.format)
+        self.status = Status(self._bus, readers)
+        if self._caps.has_ch2:
+            self.ch2 = Channel(self._bus, self._caps, readers, '2')
 
     def write(self, command):
         self._bus.write(command)
@@ -128,14 +270,15 @@ class Device:
         return self._bus.read_raw()
 
     def disconnect(self):
+        self._settings_readers.clear()
         self._bus.close()
 
 
 class Common:
-    def __init__(self, bus):
+    def __init__(self, bus, readers):
         self._bus = bus
         self._validate = ValidateRegister()
-        self._command = Command(self._bus)
+        self._command = Command(self._bus, readers)
 
     # Clears event registers and errors
     def cls(self):
@@ -145,10 +288,8 @@ class Common:
     # Read standard event enable register (no param)
     # Write with param
     def ese(self, reg_value=None):
-        query = '*ESE?'
-        write = '*ESE'
         return self._command.read_write(
-            query, write, self._validate.register_8,
+            *_ESE, self._validate.register_8,
             reg_value)
 
     # Read and clear standard event enable register
@@ -164,39 +305,35 @@ class Common:
     # Set the operation complete bit in the standard event register or queue
     # (param=1) places into output queue when operation complete
     def opc(self, reg_value=None):
-        query = '*OPC?'
-        write = '*OPC'
         return self._command.read_write(
-            query, write, None, reg_value)
+            *_OPC, None, reg_value)
 
     # Returns the power supply to the saved setup (0...9)
     def rcl(self, preset_value=None):
-        query = '*RCL?'
-        write = '*RCL'
-        return self._command.read_write(
-            query, write, self._validate.preset,
+        value = self._command.read_write(
+            *_RCL, self._validate.preset,
             preset_value)
+        if preset_value is not None:
+            self._command.refresh_settings()
+        return value
 
     # Returns the power supply to the *RST default conditions
     def rst(self):
         write = "*RST"
         self._command.write(write)
         self.cls()
+        self._command.refresh_settings()
 
     # Saves the present setup (1..9)
     def sav(self, preset_value=None):
-        query = '*SAV?'
-        write = '*SAV'
         return self._command.read_write(
-            query, write, self._validate.preset,
+            *_SAV, self._validate.preset,
             preset_value)
 
     # Programs the service request enable register
     def sre(self, reg_value=None):
-        query = '*SRE?'
-        write = '*SRE'
         return self._command.read_write(
-            query, write, self._validate.register_8,
+            *_SRE, self._validate.register_8,
             reg_value)
 
     # Reads the status byte register
@@ -221,27 +358,51 @@ class Common:
 
 
 class Channel:
-    def __init__(self, bus, channel: str):
+    def __init__(self, bus, caps, readers, channel: str):
         self._bus = bus
-        self._validate = ValidateChannel()
-        self._command = Command(self._bus)
+        self._caps = caps
+        self._validate = ValidateChannel(caps)
+        self._command = Command(self._bus, readers)
         self._channel = channel
+        # Channel 1 commands have no numeric suffix
+        suffix = '' if channel == '1' else '2'
+        self._q_volt = f'VOLT{suffix}?'
+        self._w_volt = f'VOLT{suffix}'
+        self._q_curr = f'CURR{suffix}?'
+        self._w_curr = f'CURR{suffix}'
+        # Validators bound to this channel's limits
+        self._validate_voltage = functools.partial(
+            self._validate.voltage, channel=channel)
+        self._validate_current = functools.partial(
+            self._validate.current, channel=channel)
         self._ch_set = {}
-        self._ch_set = {
-            'output':   self.is_on(),
-            'voltage': self.voltage(),
-            'current': self.current(),
-            'impedance': self.impedance(),
-            'current_range': self.current_range(),
-            'output_compensation': self.output_compensation()}
+        self._read_settings()
+        self._command.register_settings(self._read_settings)
         self.values = {
-            'device': global_input_values,
+            'device': self._caps,
             'settings': self._ch_set}
 
         # Channel objects
         self.meas = Measure(self._bus, self._channel)
         self.prot = Protection(self._bus, self._channel)
 
+    # Read all channel settings with a single compound query
+    def _read_settings(self):
+        queries = {
+            'output': 'OUTP' + self._channel + ':STAT?',
+            'voltage': self._q_volt,
+            'current': self._q_curr}
+        if self._caps.has_expanded:
+            queries['impedance'] = _RES[0]
+        if self._channel == '1':
+            queries['current_range'] = _CURR_RANG[0]
+        queries['output_compensation'] = _COMP_MODE[0]
+        self._ch_set.update(zip(
+            queries, self._command.batch_read(queries.values())))
+        # Settings the model/channel does not support
+        self._ch_set.setdefault('impedance', 'NA')
+        self._ch_set.setdefault('current_range', 'MAX')
+
     # ############################
     # Channel settings functions #
     # ############################
@@ -250,13 +411,14 @@ class Channel:
     def on(self):
         write = 'OUTP' + self._channel + ' ON'
         self._command.write(write)
-        self._ch_set['output'] = self.is_on
+        # Same reply as OUTP:STAT? without querying it
+        self._ch_set['output'] = '1'
 
     # Turn channel output off
     def off(self):
         write = 'OUTP' + self._channel + ' OFF'
         self._command.write(write)
-        self._ch_set['output'] = self.is_on
+        self._ch_set['output'] = '0'
 
     # get channel output state
     def is_on(self):
@@ -265,67 +427,47 @@ class Channel:
 
     # resolution: 1mV
     def voltage(self, set_voltage=None):
-        if self._channel == '1':
-            query = 'VOLT?'
-            write = 'VOLT'
-        else:
-            query = 'VOLT2?'
-            write = 'VOLT2'
-        self._validate.voltage(set_voltage, self._channel)
         return self._command.read_write(
-            query, write, None,
+            self._q_volt, self._w_volt, self._validate_voltage,
             set_voltage, self._ch_set, 'voltage')
 
     # Sets current limit in Amps
     # resolution: 1mA
     def current(self, set_current=None):
-        if self._channel == '1':
-            query = 'CURR?'
-            write = 'CURR'
-        else:
-            query = 'CURR?'
-            write = 'CURR2'
-        self._validate.current(set_current, self._channel)
         return self._command.read_write(
-            query, write, None,
+            self._q_curr, self._w_curr, self._validate_current,
             set_current, self._ch_set, 'current')
 
     def current_range(self, set_current_range=None):
         if self._channel == '1':
-            query = 'SENS:CURR:RANG?'
-            write = 'SENS:CURR:RANG'
             return self._command.read_write(
-                query, write, self._validate.current_range,
+                *_CURR_RANG, self._validate.current_range,
                 set_current_range, self._ch_set, 'current_range')
         elif set_current_range is None:
             return 'MAX'
 
     def output_compensation(self, set_output_compensation=None):
-        query = 'OUTP:COMP:MODE?'
-        write = 'OUTP:COMP:MODE'
         return self._command.read_write(
-            query, write, self._validate.output_compensation,
+            *_COMP_MODE, self._validate.output_compensation,
             set_output_compensation, self._ch_set, 'output_compensation')
 
     # Set output impedance for channel (Battery simulation)
     # -0.04 - 1 Ohms; 1 mOhm resolution
     def impedance(self, set_impedance=None):
-        if global_input_values['expanded_features']:
-            query = 'RES?'
-            write = 'RES'
+        if self._caps.has_expanded:
             return self._command.read_write(
-                query, write, self._validate.impedance,
+                *_RES, self._validate.impedance,
                 set_impedance, self._ch_set, 'impedance')
         else:
             return 'NA'
 
 
 class Display:
-    def __init__(self, bus):
+    def __init__(self, bus, caps):
         self._bus = bus
+        self._caps = caps
         self._command = Command(self._bus)
         self._is_on = self.is_on()
-        self._has_ch2 = global_input_values['ch2']
 
     # Enables or disables the LC Display
     def on(self):
@@ -345,7 +487,7 @@ class Display:
         self._command.write(write)
 
     def show_ch2(self):
-        if self._has_ch2:
+        if self._caps.has_ch2:
             write = 'DISP:CHAN 2'
             self._command.write(write)
 
@@ -366,56 +508,93 @@ class Display:
 
 
 class Format:
-    def __init__(self, bus, data='ASC', border='NORM'):
+    def __init__(self, bus, caps, readers, data='ASC', border='NORM'):
         self._bus = bus
+        self._caps = caps
         self._validate = ValidateFormat()
-        self._command = Command(self._bus)
+        self._command = Command(self._bus, readers)
         self._format = {}
-        self._format = {
-            'data_format':   self.data_format(),
-            'byte_order': self.byte_order()}
+        self._read_settings()
+        self._command.register_settings(self._read_settings)
         self.values = {
-            'device': global_input_values,
+            'device': self._caps,
             'settings': self._format}
         self.data_format(data)
         self.byte_order(border)
 
+    # Read all format settings with a single compound query
+    def _read_settings(self):
+        queries = {
+            'data_format': _FORM_DATA[0],
+            'byte_order': _FORM_BORD[0]}
+        self._format.update(zip(
+            queries, self._command.batch_read(queries.values())))
+
     # Specifies the output data format for MEAS:ARR: ; FETC:ARR:
     def data_format(self, set_data_format=None):
-        query = ':FORM:DATA?'
-        write = ':FORM:DATA'
         return self._command.read_write(
-            query, write, self._validate.data,
+            *_FORM_DATA, self._validate.data,
             set_data_format, self._format, 'data_format')
 
     # Specifies byte order for non ASCII output formats.
     def byte_order(self, set_byte_order=None):
-        query = ':FORM:BORD?'
-        write = ':FORM:BORD'
         return self._command.read_write(
-            query, write, self._validate.border,
+            *_FORM_BORD, self._validate.border,
             set_byte_order, self._format, 'byte_order')
 
+    # Re-send the cached format settings, after a transfer changed them
+    def restore_settings(self):
+        self._command.write(
+            f"{_FORM_DATA[1]} {self._format['data_format']};"
+            f"{_FORM_BORD[1]} {self._format['byte_order']}")
+
 
 class Log:
-    def __init__(self, bus):
+    # WTG(wait_for_trig) goes high when measurement
+    # trigger is initialized, and goes low when the
+    # trigger activates. A negative transition event
+    # indicates the device has triggered successfully
+    _WAIT_FOR_TRIG = 32
+
+    # The bit in STB that is forwarded from the operational event register
+    # An SRQ will be generated for this bit
+    _SRE_STATUS_BIT = 128
+
+    # form is the device's Format, restored after binary transfers
+    def __init__(self, bus, caps, readers, form):
         self._bus = bus
+        self._caps = caps
+        self._form = form
         self._validate = ValidateLog()
-        self._command = Command(self._bus)
+        self._command = Command(self._bus, readers)
         self._log = {}
-        self._log = {
-            'sample_points':   self.sample_points(),
-            'integration_time': self.integration_time(),
-            'sample_offset': self.sample_offset()}
+        self._read_settings()
+        self._command.register_settings(self._read_settings)
         self.values = {
-            'device': global_input_values,
+            'device': self._caps,
             'settings': self._log}
         self.log_data = {}
+        # Sample time arrays keyed by (integration_time, sample_points)
+        self._time_axis_cache = {}
+        # Operational ptr/ntr/enable registers saved by the first sample,
+        # until restore_registers()
+        self._saved_regs = None
+        # Fetch sweep data as binary REAL,32 blocks (False: comma separated ASCII)
+        self.binary_transfer = True
 
         # Log class objects
-        self.trig = Trigger(self._bus)
-        self.status = Status(self._bus)
-        self.com = Common(self._bus)
+        self.trig = Trigger(self._bus, self._caps, readers)
+        self.status = Status(self._bus, readers)
+        self.com = Common(self._bus, readers)
+
+    # Read all log settings with a single compound query
+    def _read_settings(self):
+        queries = {
+            'sample_points': _SWE_POIN[0],
+            'integration_time': _SWE_TINT[0],
+            'sample_offset': _SWE_OFFS_POIN[0]}
+        self._log.update(zip(
+            queries, self._command.batch_read(queries.values())))
 
     # #######################
     # Log setting functions #
@@ -424,28 +603,22 @@ class Log:
     # Get the set number of sample points to log (arg=None)
     # Set the number of sample points to log
     def sample_points(self, set_sample_points=None):
-        query = 'SENS:SWE:POIN?'
-        write = 'SENS:SWE:POIN'
         return self._command.read_write(
-            query, write, self._validate.sample_points,
+            *_SWE_POIN, self._validate.sample_points,
             set_sample_points, self._log, 'sample_points')
 
     # Get the integration time for sampling (arg=None)
     # Set the integration time for sampling
     def integration_time(self, set_integration_time=None):
-        query = 'SENS:SWE:TINT?'
-        write = 'SENS:SWE:TINT'
         return self._command.read_write(
-            query, write, self._validate.integration_time,
+            *_SWE_TINT, self._validate.integration_time,
             set_integration_time, self._log, 'integration_time')
 
     # Get the sample (trigger) offset in seconds (arg=None)
     # Set the sample offset in seconds
     def sample_offset(self, set_sample_offset=None):
-        query = 'SENS:SWE:OFFS:POIN?'
-        write = 'SENS:SWE:OFFS:POIN'
         return self._command.read_write(
-            query, write, self._validate.sample_offset,
+            *_SWE_OFFS_POIN, self._validate.sample_offset,
             set_sample_offset, self._log, 'sample_offset')
 
     #def sample_to_csv(self):
@@ -453,112 +626,163 @@ class Log:
 
     # Start a sample
     # All trigger and sample settings must be configured before running
-    def start_meas_sample(self, bus_triggered=False):
+    # The status registers stay configured for sampling between calls,
+    # call restore_registers() once after the last sample
+    def start_meas_sample(self, bus_triggered=False, timeout=10000):
+        self.arm_meas_sample(bus_triggered)
+        self.await_meas_sample(timeout)
+
+    # Start a sample and return once the measurement trigger is initialized
+    # Collect the data with await_meas_sample() (or use acquire())
+    def arm_meas_sample(self, bus_triggered=False):
         self.log_data = {}
-        # Clear operational event status register
-        self.status.get_opr_event_reg()
-        # Save the operational prt/ntr/enable registers
-        opr_ptr_reg = int(self.status.opr_ptr_reg())
-        opr_ntr_reg = int(self.status.opr_ntr_reg())
-        opr_enable_reg = int(self.status.opr_enable_reg())
-
-        # WTG(wait_for_trig) goes high when measurement
-        # trigger is initialized, and goes low when the
-        # trigger activates. A negative transition event
-        # indicates the device has triggered successfully
-        wait_for_trig = 32
-
-        # The bit in STB that is forwarded from the operational event register
-        # An SRQ will be generated for this bit
-        sre_status_bit = 128
-
-        # Remove 'WTG' bit from PTR if present
-        if opr_ptr_reg & wait_for_trig:
-            self.status.opr_ptr_reg(opr_ptr_reg - wait_for_trig)
-
-        # Add 'WTG' bit to NTR if not present
-        if not opr_ntr_reg & wait_for_trig:
-            self.status.opr_ntr_reg(opr_ntr_reg + wait_for_trig)
-
-        # Set enable bit for WTG
-        self.status.opr_enable_reg(wait_for_trig)
-
-        # Enable service request for operation bit (OPR)
-        self.com.sre(sre_status_bit)
-
-        self.com.wait()
-        # Initialize measurement trigger
-        self.trig.initialize_meas_trig()
-
+        if self._saved_regs is None:
+            # Clear operational event status register and
+            # save the operational ptr/ntr/enable registers
+            registers = self._command.batch_read(
+                ('STAT:OPER?', _OPER_PTR[0], _OPER_NTR[0], _OPER_ENAB[0]))
+            self._saved_regs = tuple(int(reg) for reg in registers[1:])
+        else:
+            # Clear operational event status register
+            self.status.get_opr_event_reg()
+        opr_ptr_reg, opr_ntr_reg, _ = self._saved_regs
+
+        # Queue SRQ events before the trigger is initialized,
+        # so the request cannot be missed
+        self._bus.enable_event(
+            constants.EventType.service_request,
+            constants.EventMechanism.queue)
+
+        # Arm with one message; its commands are executed in order
+        commands = [
+            # Remove 'WTG' bit from PTR, add 'WTG' bit to NTR
+            f'{_OPER_PTR[1]} {opr_ptr_reg & ~self._WAIT_FOR_TRIG}',
+            f'{_OPER_NTR[1]} {opr_ntr_reg | self._WAIT_FOR_TRIG}',
+            # Set enable bit for WTG
+            f'{_OPER_ENAB[1]} {self._WAIT_FOR_TRIG}',
+            # Enable service request for operation bit (OPR)
+            f'{_SRE[1]} {self._SRE_STATUS_BIT}',
+            # Initialize measurement trigger
+            ':INIT:NAME ACQ']
         # Calling the function with no parameters assumes an INT or EXT trigger source
         # passing True, will trigger an immediate BUS trigger (BUS must be the trigger_source)
         if bus_triggered:
-            self.trig.generate_bus_trig()
-
-        # Wait for SRQ
-        self._bus.wait_for_srq(10000)
-        self.com.sre(0)
-
-        event_reg = int(self.status.get_opr_event_reg())
-        if event_reg & wait_for_trig:
+            commands.append(':TRIG:ACQ')
+        self._bus.write(';'.join(commands))
+
+    # Wait (timeout in ms) for the SRQ of a sample started by arm_meas_sample()
+    # Fetches the data to log_data
+    def await_meas_sample(self, timeout=10000):
+        try:
+            self._bus.wait_on_event(
+                constants.EventType.service_request, timeout)
+            # Serial poll clears the request
+            self._bus.read_stb()
+        except BaseException:
+            self.com.sre(0)
+            raise
+        finally:
+            self._bus.disable_event(
+                constants.EventType.service_request,
+                constants.EventMechanism.queue)
+            self._bus.discard_events(
+                constants.EventType.service_request,
+                constants.EventMechanism.queue)
+
+        # Disable the service request and read (clear) the event register
+        event_reg = int(self._command.read(f'{_SRE[1]} 0;:STAT:OPER?'))
+        if event_reg & self._WAIT_FOR_TRIG:
             if self.trig._trig['sense'] in '"CURR"':
-                data = self._bus.query('FETC:ARR:CURR?')
-                self.log_data['current'] = np.array(
-                        data.split(','), dtype='f')
+                self.log_data['current'] = self._fetch_array('FETC:ARR:CURR?')
             elif self.trig._trig['sense'] in '"VOLT"':
-                data = self._bus.query('FETC:ARR:VOLT?')
-                self.log_data['voltage'] = np.array(
-                        data.split(','), dtype='f')
+                self.log_data['voltage'] = self._fetch_array('FETC:ARR:VOLT?')
             else:
-                data = self._bus.query('FETC:ARR:DVM?')
-                self.log_data['voltage'] = np.array(
-                        data.split(','), dtype='f')
-            self.log_data['seconds'] = np.arange(
-                    0, float(self._log['integration_time']) *
-                    float(self._log['sample_points']),
-                    float(self._log['integration_time'])
-            )
+                self.log_data['voltage'] = self._fetch_array('FETC:ARR:DVM?')
+            self.log_data['seconds'] = self._time_axis()
         else:
             print('Unknown error: event reg {}'.format(str(event_reg)))
 
-        # Restore Registers
-        self.status.opr_ptr_reg(opr_ptr_reg)
-        self.status.opr_ntr_reg(opr_ntr_reg)
-        self.status.opr_enable_reg(opr_enable_reg)
+    # Restore the operational ptr/ntr/enable registers saved by the first
+    # sample, run once after a series of samples
+    def restore_registers(self):
+        if self._saved_regs is not None:
+            opr_ptr_reg, opr_ntr_reg, opr_enable_reg = self._saved_regs
+            self._bus.write(
+                f'{_OPER_PTR[1]} {opr_ptr_reg};'
+                f'{_OPER_NTR[1]} {opr_ntr_reg};'
+                f'{_OPER_ENAB[1]} {opr_enable_reg}')
+            self._saved_regs = None
+
+    # asyncio version of start_meas_sample, returns log_data
+    # The wait for the SRQ runs in an executor thread, not on the event loop
+    async def acquire(self, bus_triggered=False, timeout=10000):
+        self.arm_meas_sample(bus_triggered)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.await_meas_sample, timeout)
+        return self.log_data
+
+    # Sample times for the configured sweep, reused while settings are unchanged
+    # Cached arrays are shared between sweeps, so they are made read-only
+    def _time_axis(self):
+        integration_time = float(self._log['integration_time'])
+        sample_points = int(float(self._log['sample_points']))
+        key = (integration_time, sample_points)
+        if key not in self._time_axis_cache:
+            seconds = np.linspace(
+                0, integration_time * (sample_points - 1), sample_points,
+                dtype=np.float32)
+            seconds.flags.writeable = False
+            self._time_axis_cache[key] = seconds
+        return self._time_axis_cache[key]
+
+    # Fetch a measurement array as big-endian 32 bit floats
+    # pyvisa reads the IEEE 488.2 definite length block to its full length
+    # The transfer format is set for the fetch only, then the user's
+    # format (as held in the Format cache) is restored
+    def _fetch_array(self, query):
+        if not self.binary_transfer:
+            return np.fromstring(
+                self._bus.query(query), dtype=np.float32, sep=',')
+        try:
+            data = self._bus.query_binary_values(
+                'FORM:DATA REAL,32;:FORM:BORD NORM;:' + query,
+                datatype='f', is_big_endian=True, container=np.ndarray)
+            return data.astype(np.float32)
+        finally:
+            self._form.restore_settings()
 
 
 class Measure:
+    # Measurement replies are returned as numpy.float32
+    _parse = np.float32
+
     def __init__(self, bus, channel):
         self._bus = bus
         self._channel = channel
         self._command = Command(self._bus)
+        suffix = '' if channel == '1' else '2'
+        self._q_meas_volt = f'MEAS:VOLT{suffix}?'
+        self._q_meas_curr = f'MEAS:CURR{suffix}?'
 
     def __get_stat(self, meas_source: str, stat_type: str):
         query = 'MEAS:' + meas_source + ':' + stat_type + '?'
-        return self._command.read(query)
+        return self._parse(self._command.read(query))
 
     # ###############################
     # Channel measurement functions #
     # ###############################
 
     def voltage(self):
-        if self._channel == '1':
-            query = 'MEAS:VOLT?'
-        else:
-            query = 'MEAS:VOLT2?'
-        return self._command.read(query)
+        return self._parse(self._command.read(self._q_meas_volt))
 
     def current(self):
-        if self._channel == '1':
-            query = 'MEAS:CURR?'
-        else:
-            query = 'MEAS:CURR2?'
-        return self._command.read(query)
+        return self._parse(self._command.read(self._q_meas_curr))
 
+    # Voltage and current are read in one compound query
     def power(self):
-        volts = np.single(self.voltage())
-        curr = np.single(self.current())
-        return str(volts * curr)
+        volts, curr = self._command.batch_read(
+            (self._q_meas_volt, self._q_meas_curr))
+        return self._parse(volts) * self._parse(curr)
 
     def current_low(self):
         return self.__get_stat('CURR', 'LOW')
@@ -631,29 +855,41 @@ class Measure:
 
 
 class Trigger:
-    def __init__(self, bus):
+    def __init__(self, bus, caps, readers):
         self._bus = bus
-        self._validate = ValidateTrigger()
-        self._command = Command(self._bus)
+        self._caps = caps
+        self._validate = ValidateTrigger(caps)
+        self._command = Command(self._bus, readers)
         self._trig = {}
-        self._trig = {
-            'source':   self.source(),
-            'sense': self.sense(),
-            'current_level': self.current_level(),
-            'current_hysteresis': self.current_hysteresis(),
-            'current_slope': self.current_slope(),
-            'current_count': self.current_count(),
-            'voltage_level': self.voltage_level(),
-            'voltage_hysteresis': self.voltage_hysteresis(),
-            'voltage_slope': self.voltage_slope(),
-            'voltage_count': self.voltage_count(),
-            'dvm_level': self.dvm_level(),
-            'dvm_hysteresis': self.dvm_hysteresis(),
-            'dvm_slope': self.dvm_slope()}
+        self._read_settings()
+        self._command.register_settings(self._read_settings)
         self.values = {
-            'device': global_input_values,
+            'device': self._caps,
             'settings': self._trig}
 
+    # Read all trigger settings with a single compound query
+    def _read_settings(self):
+        queries = {
+            'source': _TRIG_SOUR[0],
+            'sense': 'SENS:FUNC?',
+            'current_level': _TRIG_LEV_CURR[0],
+            'current_hysteresis': _TRIG_HYST_CURR[0],
+            'current_slope': _TRIG_SLOP_CURR[0],
+            'current_count': _TRIG_COUN_CURR[0],
+            'voltage_level': _TRIG_LEV_VOLT[0],
+            'voltage_hysteresis': _TRIG_HYST_VOLT[0],
+            'voltage_slope': _TRIG_SLOP_VOLT[0],
+            'voltage_count': _TRIG_COUN_VOLT[0]}
+        if self._caps.has_dvm:
+            queries['dvm_level'] = _TRIG_LEV_DVM[0]
+            queries['dvm_hysteresis'] = _TRIG_HYST_DVM[0]
+            queries['dvm_slope'] = _TRIG_SLOP_DVM[0]
+        self._trig.update(zip(
+            queries, self._command.batch_read(queries.values())))
+        # Settings the model does not support
+        for key in ('dvm_level', 'dvm_hysteresis', 'dvm_slope'):
+            self._trig.setdefault(key, 'NA')
+
     def generate_bus_trig(self):
         write = 'TRIG:ACQ'
         self._command.write(write)
@@ -671,114 +907,94 @@ class Trigger:
         self._command.write(write)
 
     def source(self, set_source=None):
-        query = 'TRIG:ACQ:SOUR?'
-        write = 'TRIG:ACQ:SOUR'
         return self._command.read_write(
-            query, write, self._validate.source,
+            *_TRIG_SOUR, self._validate.source,
             set_source, self._trig, 'source')
 
     def sense(self, set_sense=None):
-        val = self._validate.sense(set_sense)
         query = 'SENS:FUNC?'
-        write = 'SENS:FUNC "' + str(val) + '"'
         if set_sense is None:
             return self._command.read(query)
-        else:
-            self._command.write(write)
-            self._trig['settings'] = self._command.read(query)
+        try:
+            val = self._validate.sense(set_sense)
+        except (ValueError, TypeError) as err:
+            _warn(err)
+            return None
+        if self._command.is_cached(self._trig['sense'], set_sense):
             return None
+        self._command.write('SENS:FUNC "' + val + '"')
+        self._trig['sense'] = self._command.read(query)
+        return None
 
     def current_count(self, set_current_count=None):
-        query = 'TRIG:ACQ:COUN:CURR?'
-        write = 'TRIG:ACQ:COUN:CURR'
         return self._command.read_write(
-            query, write, self._validate.count,
+            *_TRIG_COUN_CURR, self._validate.count,
             set_current_count, self._trig, 'current_count')
 
     def voltage_count(self, set_voltage_count=None):
-        query = 'TRIG:ACQ:COUN:VOLT?'
-        write = 'TRIG:ACQ:COUN:VOLT'
         return self._command.read_write(
-            query, write, self._validate.count,
+            *_TRIG_COUN_VOLT, self._validate.count,
             set_voltage_count, self._trig, 'voltage_count')
 
     def current_hysteresis(self, set_current_hysteresis=None):
-        query = 'TRIG:ACQ:HYST:CURR?'
-        write = 'TRIG:ACQ:HYST:CURR'
         return self._command.read_write(
-            query, write, self._validate.current,
+            *_TRIG_HYST_CURR, self._validate.current,
             set_current_hysteresis, self._trig, 'current_hysteresis')
 
     def voltage_hysteresis(self, set_voltage_hysteresis=None):
-        query = 'TRIG:ACQ:HYST:VOLT?'
-        write = 'TRIG:ACQ:HYST:VOLT'
         return self._command.read_write(
-            query, write, self._validate.voltage,
+            *_TRIG_HYST_VOLT, self._validate.voltage,
             set_voltage_hysteresis, self._trig, 'voltage_hysteresis')
 
     def dvm_hysteresis(self, set_dvm_hysteresis=None):
-        if global_input_values['dvm']:
-            query = 'TRIG:ACQ:HYST:DVM?'
-            write = 'TRIG:ACQ:HYST:DVM'
+        if self._caps.has_dvm:
             return self._command.read_write(
-                query, write, self._validate.dvm,
+                *_TRIG_HYST_DVM, self._validate.dvm,
                 set_dvm_hysteresis, self._trig, 'dvm_hysteresis')
         else:
             return 'NA'
 
     def current_level(self, set_current_level=None):
-        query = 'TRIG:ACQ:LEV:CURR?'
-        write = 'TRIG:ACQ:LEV:CURR'
         return self._command.read_write(
-            query, write, self._validate.current,
+            *_TRIG_LEV_CURR, self._validate.current,
             set_current_level, self._trig, 'current_level')
 
     def voltage_level(self, set_voltage_level=None):
-        query = 'TRIG:ACQ:LEV:VOLT?'
-        write = 'TRIG:ACQ:LEV:VOLT'
         return self._command.read_write(
-            query, write, self._validate.voltage,
+            *_TRIG_LEV_VOLT, self._validate.voltage,
             set_voltage_level, self._trig, 'voltage_level')
 
     def dvm_level(self, set_dvm_level=None):
-        if global_input_values['dvm']:
-            query = 'TRIG:ACQ:LEV:DVM?'
-            write = 'TRIG:ACQ:LEV:DVM'
+        if self._caps.has_dvm:
             return self._command.read_write(
-                query, write, self._validate.dvm,
+                *_TRIG_LEV_DVM, self._validate.dvm,
                 set_dvm_level, self._trig, 'dvm_level')
         else:
             return 'NA'
 
     def current_slope(self, set_current_slope=None):
-        query = 'TRIG:ACQ:SLOP:CURR?'
-        write = 'TRIG:ACQ:SLOP:CURR'
         return self._command.read_write(
-            query, write, self._validate.slope,
+            *_TRIG_SLOP_CURR, self._validate.slope,
             set_current_slope, self._trig, 'current_slope')
 
     def voltage_slope(self, set_voltage_slope=None):
-        query = 'TRIG:ACQ:SLOP:VOLT?'
-        write = 'TRIG:ACQ:SLOP:VOLT'
         return self._command.read_write(
-            query, write, self._validate.slope,
+            *_TRIG_SLOP_VOLT, self._validate.slope,
             set_voltage_slope, self._trig, 'voltage_slope')
 
     def dvm_slope(self, set_dvm_slope=None):
-        if global_input_values['dvm']:
-            query = 'TRIG:ACQ:SLOP:DVM?'
-            write = 'TRIG:ACQ:SLOP:DVM'
+        if self._caps.has_dvm:
             return self._command.read_write(
-                query, write, self._validate.slope,
+                *_TRIG_SLOP_DVM, self._validate.slope,
                 set_dvm_slope, self._trig, 'dvm_slope')
         else:
             return 'NA'
 
 
 class Status:
-    def __init__(self, bus):
+    def __init__(self, bus, readers):
         self._bus = bus
-        self.com = Common(self._bus)
+        self.com = Common(self._bus, readers)
         self._validate = ValidateRegister()
         self._command = Command(self._bus)
 
@@ -791,24 +1007,18 @@ class Status:
         return self._command.read(query)
 
     def opr_enable_reg(self, reg_value=None):
-        query = ':STAT:OPER:ENAB?'
-        write = ':STAT:OPER:ENAB'
         return self._command.read_write(
-            query, write, self._validate.register_16,
+            *_OPER_ENAB, self._validate.register_16,
             reg_value)
 
     def opr_ptr_reg(self, reg_value=None):
-        query = ':STAT:OPER:PTR?'
-        write = ':STAT:OPER:PTR'
         return self._command.read_write(
-            query, write, self._validate.register_16,
+            *_OPER_PTR, self._validate.register_16,
             reg_value)
 
     def opr_ntr_reg(self, reg_value=None):
-        query = ':STAT:OPER:NTR?'
-        write = ':STAT:OPER:NTR'
         return self._command.read_write(
-            query, write, self._validate.register_16,
+            *_OPER_NTR, self._validate.register_16,
             reg_value)
 
     def get_ques_event_reg(self):
@@ -820,24 +1030,18 @@ class Status:
         return self._command.read(query)
 
     def ques_enable_reg(self, reg_value=None):
-        query = ':STAT:QUES:ENAB?'
-        write = ':STAT:QUES:ENAB'
         return self._command.read_write(
-            query, write, self._validate.register_16,
+            *_QUES_ENAB, self._validate.register_16,
             reg_value)
 
     def ques_ptr_reg(self, reg_value=None):
-        query = ':STAT:QUES:PTR?'
-        write = ':STAT:QUES:PTR'
         return self._command.read_write(
-            query, write, self._validate.register_16,
+            *_QUES_PTR, self._validate.register_16,
             reg_value)
 
     def ques_ntr_reg(self, reg_value=None):
-        query = ':STAT:QUES:NTR?'
-        write = ':STAT:QUES:NTR'
         return self._command.read_write(
-            query, write, self._validate.register_16,
+            *_QUES_NTR, self._validate.register_16,
             reg_value)
 
     def reset_all_status_reg(self):
@@ -877,434 +1081,319 @@ class DigitalIO:
 
 
 class Validate:
-
-    def float_range(self):
-        return lambda x, y: y[0] <= x <= y[1]
-
-    def int_range(self):
-        return lambda x, y: x in range(y[0], y[1] + 1)
-
-    def find_element(self):
-        return lambda x, y: x in y
+    # Validators and Command hold no per-instance state beyond their slots
+    __slots__ = ()
 
     def error_text(self, warning_type, error_type):
-        ansi_esc_seq = {'HEADER': '\033[95m',
-                        'OKBLUE': '\033[94m',
-                        'OKGREEN': '\033[92m',
-                        'WARNING': '\033[93m',
-                        'FAIL': '\033[91m',
-                        'ENDC': '\033[0m',
-                        'BOLD': '\033[1m',
-                        'UNDERLINE': '\033[4m'
-                        }
-        return str(ansi_esc_seq[warning_type] + str(error_type) + ansi_esc_seq['ENDC'])
-
-    def float_rng_and_str_tuples(self, validation_set, value, round_to):
-        if isinstance(value, (float, int)):
-            val = round(float(value), round_to)
-            validator = self.float_range()
-            if validator(val, validation_set[0]):
-                return str(value)
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in range:(float, int) {}\n'
-                                  'or in set:(str) {}'.format(
-                    validation_set[0],
-                    validation_set[1]))
-        elif isinstance(value, str):
-            val = value.lower()
-            validator = self.find_element()
-            if validator(val, str(validation_set[1]).lower()):
-                return val.upper()
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in set:(str) {}\n'
-                                  'or in range:(float, int) {}'.format(
-                    validation_set[1],
-                    validation_set[0]))
-        else:
-            return TypeError('TypeError!\n'
-                             'Received type: {}\n'
-                             'Valid types: {}, {}, {}'.format(
-                type(value), int, float, str))
-
-    def int_rng_and_str_tuples(self, validation_set, value):
-        if isinstance(value, int):
-            val = value
-            validator = self.int_range()
-            if validator(val, validation_set[0]):
-                return str(value)
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in range:(int) {}\n'
-                                  'or in set:(str) {}'.format(
-                    validation_set[0],
-                    validation_set[1]))
-        elif isinstance(value, str):
-            val = value.lower()
-            validator = self.find_element()
-            if validator(val, str(validation_set[1]).lower()):
-                return val.upper()
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in set:(str) {}\n'
-                                  'or in range:(int) {}'.format(
-                    validation_set[1],
-                    validation_set[0]))
-        else:
-            return TypeError('TypeError!\n'
-                             'Received type: {}\n'
-                             'Valid types: {}, {}'.format(
-                type(value), int, str))
-
-    def float_and_str_tuples(self, validation_set, value):
-        if isinstance(value, (float, int)):
-            validator = self.find_element()
-            val = float(value)
-            if validator(val, validation_set[0]):
-                return str(value)
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in set:(float, int) {}\n'
-                                  'or in set:(str) {}'.format(
-                    validation_set[0],
-                    validation_set[1]))
-        elif isinstance(value, str):
-            val = value.lower()
-            validator = self.find_element()
-            if validator(val, str(validation_set[1]).lower()):
-                return val.upper()
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in set:(str) {}\n'
-                                  'or in set:(float, str) {}'.format(
-                    validation_set[1],
-                    validation_set[0]))
-        else:
-            return TypeError('TypeError!\n'
-                             'Received type: {}\n'
-                             'Valid types: {}, {}, {}'.format(
-                type(value), int, float, str))
-
-    def int_and_str_tuples(self, validation_set, value):
-        if isinstance(value, int):
-            validator = self.find_element()
-            val = float(value)
-            if validator(val, validation_set[0]):
-                return str(value)
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in set:(int) {}\n'
-                                  'or in set:(str) {}'.format(
-                    validation_set[0],
-                    validation_set[1]))
-        elif isinstance(value, str):
-            val = value.lower()
-            validator = self.find_element()
-            if validator(val, str(validation_set[1]).lower()):
-                return val.upper()
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in set:(str) {}\n'
-                                  'or in set:(int) {}'.format(
-                    validation_set[1],
-                    validation_set[0]))
-        else:
-            return TypeError('TypeError!\n'
-                             'Received type: {}\n'
-                             'Valid types: {}, {}'.format(
-                type(value), int, str))
-
-    def float_rng_tuple(self, validation_set, value, round_to):
-        if isinstance(value, (float, int)):
-            val = round(float(value), round_to)
-            validator = self.float_range()
-            if validator(val, validation_set):
+        return f'{_ANSI[warning_type]}{error_type}{_ANSI_ENDC}'
+
+    # Single check behind all the Validate* methods. value is accepted as a
+    # keyword in keywords (str, any case) or as a number in the numbers
+    # range (or set, use_range=False); floats are numbers only when floats
+    # is set. Returns the value in the form sent to the instrument
+    def _validate(self, value, numbers=None, keywords=None, *,
+                  floats=False, use_range=True, round_to=None):
+        try:
+            check = self._CHECKS[type(value)]
+        except KeyError:
+            check = self._check_for(type(value))
+        return check(self, value, numbers, keywords,
+                     floats, use_range, round_to)
+
+    def _check_keyword(self, value, numbers, keywords,
+                       floats, use_range, round_to):
+        if keywords is None:
+            raise self._type_error(value, numbers, keywords, floats)
+        val = _KEYWORD_LOWER.get(value) or value.lower()
+        if val in keywords:
+            return _KEYWORD_UPPER[val]
+        raise self._value_error(True, numbers, keywords, floats, use_range)
+
+    def _check_float(self, value, numbers, keywords,
+                     floats, use_range, round_to):
+        if not floats:
+            raise self._type_error(value, numbers, keywords, floats)
+        return self._check_number(value, numbers, keywords,
+                                  floats, use_range, round_to)
+
+    def _check_number(self, value, numbers, keywords,
+                      floats, use_range, round_to):
+        if numbers is None:
+            raise self._type_error(value, numbers, keywords, floats)
+        if use_range:
+            # Rounding can only bring a value just outside the range
+            # back in, so it is skipped when already in range
+            low, high = numbers
+            if low <= value <= high or round_to is not None and \
+                    low <= round(float(value), round_to) <= high:
                 return str(value)
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in range:(float, int) {}'
-                                  .format(validation_set))
-        else:
-            return TypeError('TypeError!\n'
-                             'Received type: {}\n'
-                             'Valid types: {}, {}'.format(
-                type(value), int, float))
-
-    def str_tuple(self, validation_set, value):
-        if isinstance(value, str):
-            val = value.lower()
-            validator = self.find_element()
-            if validator(val, str(validation_set).lower()):
-                return val.upper()
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in set:(str) {}'.format(
-                    validation_set))
-        else:
-            return TypeError('TypeError!\n'
-                             'Received type: {}\n'
-                             'Valid types: {}'.format(
-                type(value), str))
-
-    def int_tuple(self, validation_set, value):
-        if isinstance(value, int):
-            val = value
-            validator = self.find_element()
-            if validator(val, validation_set):
-                return str(val)
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in set:(int) {}'.format(
-                    validation_set))
-        else:
-            return TypeError('TypeError!\n'
-                             'Received type: {}\n'
-                             'Valid types: {}'.format(
-                type(value), int))
-
-    def int_rng_tuple(self, validation_set, value):
-        if isinstance(value, int):
-            val = value
-            validator = self.int_range()
-            if validator(val, validation_set):
-                return str(val)
-            else:
-                return ValueError('ValueError!\n'
-                                  'Not in range:(int) {}'.format(
-                    validation_set))
-        else:
-            return TypeError('TypeError!\n'
-                             'Received type: {}\n'
-                             'Valid types: {}'.format(
-                type(value), int))
+        elif value in numbers:
+            return str(value)
+        raise self._value_error(False, numbers, keywords, floats, use_range)
+
+    def _check_other(self, value, numbers, keywords,
+                     floats, use_range, round_to):
+        raise self._type_error(value, numbers, keywords, floats)
+
+    # Check per type(value); bool is not taken as a number. Other types
+    # resolve through their MRO in _check_for, which always ends at object
+    _CHECKS = {
+        str: _check_keyword,
+        int: _check_number,
+        float: _check_float,
+        bool: _check_other,
+        object: _check_other}
+
+    @classmethod
+    def _check_for(cls, kind):
+        for base in kind.__mro__:
+            if base in cls._CHECKS:
+                return cls._CHECKS[base]
+
+    # The message names what the value failed first, then the alternative
+    @staticmethod
+    def _value_error(is_keyword, numbers, keywords, floats, use_range):
+        checks = [
+            ('in {}:{} {{}}'.format('range' if use_range else 'set',
+                                    '(float, int)' if floats else '(int)'),
+             numbers),
+            ('in set:(str) {}', keywords)]
+        if is_keyword:
+            checks.reverse()
+        checks = [check for check in checks if check[1] is not None]
+        return _LazyValueError(
+            'ValueError!\nNot ' + '\nor '.join(text for text, _ in checks),
+            *(valid for _, valid in checks))
+
+    @staticmethod
+    def _type_error(value, numbers, keywords, floats):
+        valid_types = []
+        if numbers is not None:
+            valid_types += (int, float) if floats else (int,)
+        if keywords is not None:
+            valid_types.append(str)
+        return _LazyTypeError('TypeError!\n'
+                              'Received type: {}\n'
+                              'Valid types: {}',
+            type(value), ', '.join(map(str, valid_types)))
 
 
 class ValidateChannel(Validate):
-    def __init__(self):
+    __slots__ = ('_current_range_values', '_comp_modes')
+
+    # Limits per channel
+    _VOLTAGE_VALUES = {
+        '1': ((0.0, 15.535), _MIN_MAX),
+        '2': ((0.0, 12.25), _MIN_MAX)}
+    _CURRENT_VALUES = {
+        '1': ((0.0, 3.0712), _MIN_MAX),
+        '2': ((0.0, 1.52), _MIN_MAX)}
+    _IMPEDANCE_VALUES = (-0.4, 1.0), _MIN_MAX
+    _CURRENT_RANGE_VALUES = (3.0, 0.02), _MIN_MAX
+    _CURRENT_RANGE_VALUES_EXPANDED = (3.0, 1.0, 0.02), _MIN_MAX
+    _MEAS_INTERVAL_VALUES = (0.0000156, 31200.0), _MIN_MAX
+
+    # The model dependent sets are chosen once, caps do not change
+    def __init__(self, caps):
         super().__init__()
+        if caps.has_expanded:
+            self._current_range_values = self._CURRENT_RANGE_VALUES_EXPANDED
+            self._comp_modes = _COMP_MODES_EXPANDED
+        else:
+            self._current_range_values = self._CURRENT_RANGE_VALUES
+            self._comp_modes = _COMP_MODES
 
     def voltage(self, value, channel):
-        if channel == '1':
-            voltage_values = (0.0, 15.535), ('min', 'max')
-        else:
-            voltage_values = (0.0, 12.25), ('min', 'max')
-        return self.float_rng_and_str_tuples(voltage_values, value, 3)
+        return self._validate(
+            value, *self._VOLTAGE_VALUES[channel], floats=True, round_to=3)
 
     def voltage_ch2(self, value):
-        voltage_values = (0.0, 12.25), ('min', 'max')
-        return self.float_rng_and_str_tuples(voltage_values, value, 3)
+        return self._validate(
+            value, *self._VOLTAGE_VALUES['2'], floats=True, round_to=3)
 
     def current(self, value, channel):
-        if channel == '1':
-            current_values = (0.0, 3.0712), ('min', 'max')
-        else:
-            current_values = (0.0, 1.52), ('min', 'max')
-        return self.float_rng_and_str_tuples(current_values, value, 3)
+        return self._validate(
+            value, *self._CURRENT_VALUES[channel], floats=True, round_to=3)
 
     def impedance(self, value):
-        impedance_values = (-0.4, 1.0), ('min', 'max')
-        return self.float_rng_and_str_tuples(impedance_values, value, 3)
+        return self._validate(
+            value, *self._IMPEDANCE_VALUES, floats=True, round_to=3)
 
     def current_range(self, value):
-        if global_input_values['expanded_features']:
-            current_range_values = (3.0, 1.0, 0.02), ('min', 'max')
-        else:
-            current_range_values = (3.0, 0.02), ('min', 'max')
-        return self.float_and_str_tuples(current_range_values, value)
+        return self._validate(
+            value, *self._current_range_values, floats=True, use_range=False)
 
     def measurement_interval(self, value):
-        meas_interval_values = (0.0000156, 31200.0), ('max', 'min')
-        return self.float_rng_and_str_tuples(meas_interval_values, value, 7)
+        return self._validate(
+            value, *self._MEAS_INTERVAL_VALUES, floats=True, round_to=7)
 
     def output_compensation(self, value):
-        if global_input_values['expanded_features']:
-            output_compensation_values = ('llocal', 'hlocal', 'lremote', 'hremote')
-        else:
-            output_compensation_values = ('low', 'high')
-        return self.str_tuple(output_compensation_values, value)
+        return self._validate(value, keywords=self._comp_modes)
 
     def channel(self, value):
-        channel_values = ('1', '2')
-        return self.str_tuple(channel_values, value)
+        return self._validate(value, keywords=_CHANNELS)
 
 
 class ValidateRegister(Validate):
+    __slots__ = ()
+
+    _REGISTER_8_VALUES = (0, 128)
+    _REGISTER_16_VALUES = (0, 32767)
+    _PRESET_VALUES = (0, 9)
+
     def __init__(self):
         super().__init__()
 
     def register_8(self, value):
-        register_values = (0, 128)
-        return self.int_rng_tuple(register_values, value)
+        return self._validate(value, self._REGISTER_8_VALUES)
 
     def register_16(self, value):
-        register_values = (0, 32767)
-        return self.int_rng_tuple(register_values, value)
+        return self._validate(value, self._REGISTER_16_VALUES)
 
     def preset(self, value):
-        preset_values = (0, 9)
-        return self.int_rng_tuple(preset_values, value)
+        return self._validate(value, self._PRESET_VALUES)
 
 
 class ValidateFormat(Validate):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
     def data(self, value):
-        data_values = ('ascii', 'asc', 'real')
-        return self.str_tuple(data_values, value)
+        return self._validate(value, keywords=_DATA_FORMATS)
 
     def border(self, value):
-        border_values = ('normal', 'norm',
-                         'swapped', 'swap',
-                         )
-        return self.str_tuple(border_values, value)
+        return self._validate(value, keywords=_BYTE_ORDERS)
 
 
 class ValidateLog(Validate):
+    __slots__ = ()
+
+    _SAMPLE_POINTS_VALUES = (1, 4096), _MIN_MAX
+    _INTEGRATION_TIME_VALUES = (0.0000156, 31200.0), _MIN_MAX
+    _SAMPLE_OFFSET_VALUES = (-4095, 2000000000), _MIN_MAX
+
     def __init__(self):
         super().__init__()
 
     def sample_points(self, value):
-        sample_length_values = (1, 4096), ('min', 'max')
-        return self.int_rng_and_str_tuples(sample_length_values, value)
+        return self._validate(value, *self._SAMPLE_POINTS_VALUES)
 
     def integration_time(self, value):
-        sample_interval_values = (0.0000156, 31200.0), ('min', 'max')
-        return self.float_rng_and_str_tuples(sample_interval_values, value, 7)
+        return self._validate(
+            value, *self._INTEGRATION_TIME_VALUES, floats=True, round_to=7)
 
     def sample_offset(self, value):
-        sample_offset_values = (-4095, 2000000000), ('min', 'max')
-        return self.int_rng_and_str_tuples(sample_offset_values, value)
+        return self._validate(value, *self._SAMPLE_OFFSET_VALUES)
 
 
 class ValidateTrigger(Validate):
-    def __init__(self):
+    __slots__ = ('_sense_funcs',)
+
+    _VOLTAGE_VALUES = (0.0, 15.535), _MIN_MAX
+    _CURRENT_VALUES = (0.0, 3.0712), _MIN_MAX
+    _DVM_VALUES = (-4.5, 25.0), _MIN_MAX
+    _COUNT_VALUES = (1, 100), _MIN_MAX
+    _TIMEOUT_VALUES = (0.001, 60), _TIMEOUT_KEYWORDS
+
+    def __init__(self, caps):
         super().__init__()
+        if caps.has_dvm:
+            self._sense_funcs = _SENSE_FUNCS_DVM
+        else:
+            self._sense_funcs = _SENSE_FUNCS
 
     def source (self, value):
-        source_values = ('int', 'ext', 'bus')
-        return self.str_tuple(source_values, value)
+        return self._validate(value, keywords=_TRIG_SOURCES)
 
     def sense(self, value):
-        if global_input_values['dvm']:
-            sense_values = ('volt', 'curr', 'dvm')
-        else:
-            sense_values = ('volt', 'curr')
-        return self.str_tuple(sense_values, value)
+        return self._validate(value, keywords=self._sense_funcs)
 
     def voltage(self, value):
-        voltage_values = (0.0, 15.535), ('min', 'max')
-        return self.float_rng_and_str_tuples(voltage_values, value, 3)
+        return self._validate(
+            value, *self._VOLTAGE_VALUES, floats=True, round_to=3)
 
     def current(self, value):
-        current_values = (0.0, 3.0712), ('min', 'max')
-        return self.float_rng_and_str_tuples(current_values, value, 3)
+        return self._validate(
+            value, *self._CURRENT_VALUES, floats=True, round_to=3)
 
     def dvm(self, value):
-        dvm_values = (-4.5, 25.0), ('min', 'max')
-        return self.float_rng_and_str_tuples(dvm_values, value, 3)
+        return self._validate(
+            value, *self._DVM_VALUES, floats=True, round_to=3)
 
     def count(self, value):
-        count_values = (1, 100), ('min', 'max')
-        return self.int_rng_and_str_tuples(count_values, value)
+        return self._validate(value, *self._COUNT_VALUES)
 
     def slope(self, value):
-        slope_values = ('pos', 'neg', 'eith')
-        return self.str_tuple(slope_values, value)
+        return self._validate(value, keywords=_SLOPES)
 
     def timeout(self, value):
-        timeout_values = (0.001, 60), ('inf', 'min', 'max',
-                                       'def', 'default')
-        return self.float_rng_and_str_tuples(timeout_values, value, 3)
+        return self._validate(
+            value, *self._TIMEOUT_VALUES, floats=True, round_to=3)
 
 
 class Command(Validate):
-    def __init__(self, bus):
+    __slots__ = ('_bus', '_query', '_write', '_readers')
+
+    # readers is the owning Device's list of settings cache readers
+    def __init__(self, bus, readers=None):
         super().__init__()
         self._bus = bus
+        # Bound once; these are called on every SCPI transaction
+        self._query = bus.query
+        self._write = bus.write
+        self._readers = readers
 
-    def read_write_old(self, query: str, write: str,
-                       validator=None, value=None,
-                       value_set=None, value_key=None):
-        if value is None:
-            return self._bus.query(query)
-        else:
-            if validator is not None:
-                val = validator
-                if isinstance(val, (ValueError, TypeError)):
-                    print(self.error_text('WARNING', val))
-                else:
-                    self._bus.write(write)
-                    if value_set is not None:
-                        value_set[value_key] = self._bus.query(query)
-                    else:
-                        return None
-
-            else:
-                self._bus.write(write)
-                if value_set is not None:
-                    value_set[value_key] = self._bus.query(query)
-                else:
-                    return None
-
+    # value_dict caches the instrument settings: a valid value is not
+    # written when it matches the cached reply for value_key
     def read_write(self, query: str, write: str,
                    validator=None, value=None,
                    value_dict=None, value_key=None):
         if value is None:
-            return self._bus.query(query)
-        else:
-            if validator is not None:
-                val = validator(value)
-                if isinstance(val, (ValueError, TypeError)):
-                    print(self.error_text('WARNING', val))
-                else:
-                    write = write + ' ' + str(value)
-                    self._bus.write(write)
-                    if value_dict is not None:
-                        value_dict[value_key] = self._bus.query(query)
-                    return None
-
-            else:
-                write = write + ' ' + str(value)
-                self._bus.write(write)
-                if value_dict is not None:
-                    value_dict[value_key] = self._bus.query(query)
-                return None
-
-    def read_write_2arg(self, query: str, write: str,
-                   validator=None, value=None,
-                   value_dict=None, value_key=None):
-        if value is None:
-            return self._bus.query(query)
-        else:
-            if validator is not None:
-                val = validator(value)
-                if isinstance(val, (ValueError, TypeError)):
-                    print(self.error_text('WARNING', val))
-                else:
-                    write = write + ' ' + str(value)
-                    self._bus.write(write)
-                    if value_dict is not None:
-                        value_dict[value_key] = self._bus.query(query)
-                    return None
-
-            else:
-                write = write + ' ' + str(value)
-                self._bus.write(write)
-                if value_dict is not None:
-                    value_dict[value_key] = self._bus.query(query)
+            return self._query(query)
+        if validator is not None:
+            try:
+                validator(value)
+            except (ValueError, TypeError) as err:
+                _warn(err)
                 return None
+        if value_dict is not None and \
+                self.is_cached(value_dict.get(value_key), value):
+            return None
+        self._write(f'{write} {_fmt(value)}')
+        if value_dict is not None:
+            value_dict[value_key] = self._query(query)
+        return None
 
     def read(self, query: str):
-        return self._bus.query(query)
-
-    def write(self, write: str, validator=None):
-        if validator is None:
-            self._bus.write(write)
-        else:
-            val = validator
-            if isinstance(val, (ValueError, TypeError)):
-                print(self.error_text('WARNING', val))
-            else:
-                self._bus.write(write)
\ No newline at end of file
+        return self._query(query)
+
+    # Compare a set value with a cached query reply, numerically if possible
+    @staticmethod
+    def is_cached(cached, value):
+        if cached is None:
+            return False
+        try:
+            return float(cached) == float(value)
+        except (TypeError, ValueError):
+            return cached.strip('"').upper() == str(value).upper()
+
+    # Register a function that re-reads a settings cache from the instrument
+    def register_settings(self, read_settings):
+        self._readers.append(read_settings)
+
+    # Re-read all settings caches of the device, after *RST / *RCL
+    def refresh_settings(self):
+        for read_settings in self._readers:
+            read_settings()
+
+    # Send several queries as one compound SCPI message (one bus round-trip)
+    # Each query is rooted with ':' so the header path resets between them
+    def batch_read(self, queries):
+        joined = ';'.join(
+            query if query[0] in ':*' else ':' + query for query in queries)
+        return self._query(joined).split(';')
+
+    def write(self, write: str):
+        self._write(write)
\ No newline at end of file